@@ -1,13 +1,23 @@
 import sqlite3
+import atexit
+import time
+import functools
 import tkinter as tk
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from calendar import monthrange
 from tkinter import ttk, messagebox
 from contextlib import contextmanager
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.dates as mdates
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+# matplotlib 导入较慢，首次打开“数据分析”时再加载（见 _load_matplotlib）
+plt = None
+FigureCanvasTkAgg = None
+COVER_CMAP = None  # 覆盖日期的粉蓝渐变色表，随 matplotlib 一起加载
+
+# numba 为可选依赖且导入较慢，同样在首次打开“数据分析”时再加载（见 _load_kernels）
+month_stats = None
+
 # ================= 颜色配置（新增） =================
 # 【NOTICE】在这里调制你喜欢的配色~
 COLOR_SCHEME = {
@@ -22,218 +32,532 @@ COLOR_SCHEME = {
     "Meeting": "#E67E22",  # 橙色
     "Commute": "#95A5A6"   # 灰色
 }
+# 活动类型 → 整数 id，绘图时按 id 从 COLOR_RGB 中取色
+ACTIVITIES = tuple(COLOR_SCHEME)
+ACT_ID = {name: i for i, name in enumerate(ACTIVITIES)}
+# 十六进制颜色启动时一次性转成 RGB 浮点数组（按 id 索引），绘图时不再逐个解析
+COLOR_RGB = np.array(
+    [[int(COLOR_SCHEME[name][i:i+2], 16) / 255 for i in (1, 3, 5)] for name in ACTIVITIES]
+)
+
+# ================= 时间线刻度（启动时一次性生成） =================
+# 四个时间段：(标题, 起始小时, 结束小时)
+TIME_SLOTS = (
+    ("00:00-06:00", 0, 6),
+    ("06:00-12:00", 6, 12),
+    ("12:00-18:00", 12, 18),
+    ("18:00-24:00", 18, 23)
+)
+
+def _slot_ticks(start_hour, end_hour):
+    """生成时间段每半小时一个的刻度位置与标签（包含起始和结束刻度）"""
+    hours_in_slot = end_hour - start_hour + 1 if end_hour == 23 else end_hour - start_hour
+    positions = tuple(x * 0.5 for x in range(0, 2 * hours_in_slot + 1))
+    labels = tuple(
+        f"{(start_hour + x // 2) % 24:02d}:{(x % 2) * 30:02d}"
+        for x in range(0, 2 * hours_in_slot + 1)
+    )
+    return positions, labels
+
+# (起始小时, 结束小时) → (刻度位置, 刻度标签)
+SLOT_TICKS = {(start, end): _slot_ticks(start, end) for _, start, end in TIME_SLOTS}
+
+# 月视图覆盖日期的渐变条（两行相同的 0→1 渐变），所有覆盖日期共用
+COVER_GRADIENT = np.tile(np.linspace(0, 1, 256), (2, 1))
+
+# 后台 PRAGMA optimize 的间隔（毫秒）
+OPTIMIZE_INTERVAL_MS = 3600_000
+# 时间线上“进行中”条形的刷新间隔（毫秒）：6 小时的时间段上 30 秒约一个像素
+LIVE_TICK_MS = 30_000
+
+# ================= 数值计算 =================
+def bar_geometry(starts, ends, slot_lo):
+    """段内起止秒数（SQL 中已裁剪到段内）→ (相对段起点小时数, 宽度小时数, 有效掩码)
+
+    只是几十个元素的整体运算，NumPy 已足够，不值得 JIT 编译
+    """
+    lefts = (starts - slot_lo) / 3600
+    widths = (ends - starts) / 3600
+    return lefts, widths, widths > 0
+
+def _wall_seconds(epochs, origin):
+    """当日时间戳数组 → 距 origin（本地0点的 datetime）的挂钟秒数，夏令时切换日也与刻度对齐
+
+    一天内 UTC 偏移至多变化一次：二分找出切换时刻，再按时刻分两段整体加上偏移
+    """
+    lo = int(origin.timestamp())
+    hi = int((origin + timedelta(days=1)).timestamp()) - 1
+    off_lo = time.localtime(lo).tm_gmtoff
+    off_hi = time.localtime(hi).tm_gmtoff
+    base = lo + off_lo  # 当日0点的挂钟秒数
+    offsets = off_lo
+    if off_hi != off_lo:
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if time.localtime(mid).tm_gmtoff == off_lo:
+                lo = mid
+            else:
+                hi = mid
+        offsets = np.where(epochs >= hi, off_hi, off_lo)
+    return (epochs + offsets - base).astype(np.float64)
+
+def _month_stats(M, valid_mask):
+    """按有效日掩码求 M[天, 活动] 各列的日均值；单次遍历，不复制 M[valid_mask]"""
+    days, acts = M.shape
+    sums = np.zeros(acts)
+    count = 0
+    for d in range(days):
+        if valid_mask[d]:
+            count += 1
+            for a in range(acts):
+                sums[a] += M[d, a]
+    if count:
+        sums /= count
+    return sums
+
+def _month_stats_numpy(M, valid_mask):
+    """_month_stats 的纯 NumPy 版本（未安装 numba 时使用）"""
+    if not valid_mask.any():
+        return np.zeros(M.shape[1])
+    return M[valid_mask].mean(axis=0, dtype=np.float64)
 
 # ================= 数据库管理模块 =================
 class TimeTrackerDB:
+    # 与时间区间 [:range_start, :range_end) 有交集的记录（含跨区间未结束的记录）
+    # 三个分支分别走 start_time、end_time 和未结束记录的索引，不扫描区间开始前的历史
+    _RANGE_FILTER = '''
+        (
+            (start_time >= :range_start AND start_time < :range_end)
+            OR 
+            (end_time >= :range_start AND start_time < :range_start)
+            OR 
+            (end_time IS NULL AND start_time < :range_start)
+        )
+    '''
+
     def __init__(self, db_name='time_tracker.db'):
         self.db_name = db_name
+        # 已结束日期的查询结果缓存：{(查询名, 当日0点时间戳): 结果}，任何写事务提交后清空
+        self._day_cache = {}
+        self._open_since = None  # 未结束记录的开始时间（缓存判定用），None 表示待查询
+        self._current = None  # current_status 的内存副本，None 表示待查询
+        # 长连接：避免每次操作都重新打开数据库、冷启动页缓存
+        # 自动提交模式，多语句写入由 _transaction 显式包成一个事务
+        self.conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+        # page_size 只对尚未写入的新库生效，必须在切换 WAL 之前设置
+        self.conn.execute("PRAGMA page_size=8192")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._tune_cache(self.conn)
         self._init_db()
         self._init_cover_table()
+        # 长连接打开时先让 SQLite 按需分析一次各表（0x10002：检查所有表）
+        self.conn.execute("PRAGMA optimize=0x10002")
+        # 只读连接：所有查询走这里，WAL 下读写互不阻塞；query_only 让它不会去抢写锁
+        self.read_conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+        self.read_conn.execute("PRAGMA query_only=1")
+        self.read_conn.execute("PRAGMA temp_store=MEMORY")
+        self.read_conn.execute("PRAGMA busy_timeout=5000")
+        self._tune_cache(self.read_conn)
+        # 异常退出（未走 destroy）时也能整理统计信息并关闭连接
+        atexit.register(self.close)
     
+    @staticmethod
+    def _tune_cache(conn):
+        """读多写少：约 20 MB 页缓存 + 256 MB mmap，整个库可常驻内存"""
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA mmap_size=268435456")
+
     def _init_cover_table(self):
-        with self._get_connection() as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS covered_days (
-                    day DATE PRIMARY KEY,
-                    cover_type TEXT DEFAULT 'gradient'
-                )
-            ''')
+        conn = self.conn
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS covered_days (
+                day DATE PRIMARY KEY,
+                cover_type TEXT DEFAULT 'gradient'
+            )
+        ''')
             
     def cover_day(self, day):
         """标记覆盖日期"""
-        with self._get_connection() as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO covered_days (day) 
-                VALUES (?)
-            ''', (day.strftime('%Y-%m-%d'),))
-            conn.commit()
+        conn = self.conn
+        conn.execute('''
+            INSERT OR REPLACE INTO covered_days (day) 
+            VALUES (?)
+        ''', (day.strftime('%Y-%m-%d'),))
     
     def get_covered_days(self, year, month):
-        """获取指定月份的覆盖日期"""
-        with self._get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT day 
-                FROM covered_days
-                WHERE strftime('%Y', day) = ? 
-                  AND strftime('%m', day) = ?
-            ''', (str(year), f"{month:02d}"))
-            return [datetime.strptime(row[0], '%Y-%m-%d').date() for row in cursor.fetchall()]
+        """获取指定月份的覆盖日期（返回日号集合，如 frozenset({7, 8})）"""
+        # 按主键做范围查找，不对每行调用 strftime
+        first_day = date(year, month, 1)
+        next_first = first_day + timedelta(days=monthrange(year, month)[1])
+        conn = self.read_conn
+        cursor = conn.execute('''
+            SELECT day 
+            FROM covered_days
+            WHERE day >= ? AND day < ?
+        ''', (first_day.isoformat(), next_first.isoformat()))
+        return frozenset(date.fromisoformat(row[0]).day for row in cursor)
+
+    def optimize(self):
+        """让 SQLite 按需更新查询规划统计信息"""
+        # 查询都在只读连接上执行，写连接没有查询记录可参考，因此检查所有表
+        self.conn.execute("PRAGMA optimize=0x10002")
+
+    def close(self):
+        """更新查询统计信息后关闭数据库连接（可重复调用）"""
+        if self.conn is None:
+            return
+        self.optimize()
+        self.read_conn.close()
+        self.conn.close()
+        self.conn = self.read_conn = None
 
     @contextmanager
-    def _get_connection(self):
-        conn = sqlite3.connect(self.db_name)
+    def _transaction(self):
+        """显式写事务：一次加锁、一次提交，出错回滚；确有写入时才清空缓存"""
+        changes = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
         try:
-            yield conn
-        finally:
-            conn.close()
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+            if self.conn.total_changes == changes:
+                return
+            self._day_cache.clear()
+            self._open_since = None
+            self._current = None
 
     def _init_db(self):
-        with self._get_connection() as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS time_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    activity_type TEXT NOT NULL,
-                    start_time TIMESTAMP NOT NULL,
-                    end_time TIMESTAMP
-                )
-            ''')
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS current_status (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    current_activity TEXT,
-                    last_start TIMESTAMP
-                )
-            ''')
+        conn = self.conn
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS time_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                activity_type TEXT NOT NULL,
+                start_time INTEGER NOT NULL,
+                end_time INTEGER
+            )
+        ''')
+        # 旧版数据库的时间戳由 'YYYY-MM-DD HH:MM:SS' 本地时间文本迁移为整数 Unix 时间
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            with self._transaction():
+                conn.execute('''
+                    UPDATE time_records
+                    SET start_time = CAST(strftime('%s', start_time, 'utc') AS INTEGER)
+                    WHERE typeof(start_time) = 'text'
+                ''')
+                conn.execute('''
+                    UPDATE time_records
+                    SET end_time = CAST(strftime('%s', end_time, 'utc') AS INTEGER)
+                    WHERE typeof(end_time) = 'text'
+                ''')
+                conn.execute("PRAGMA user_version = 1")
+        # 单行状态表：WITHOUT ROWID 只保留一棵主键 B 树（STRICT 需要 SQLite 3.37+）
+        table_options = "WITHOUT ROWID, STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else "WITHOUT ROWID"
+        status_ddl = f'''
+            CREATE TABLE IF NOT EXISTS current_status (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                current_activity TEXT,
+                last_start INTEGER,
+                open_record_id INTEGER
+            ) {table_options}
+        '''
+        conn.execute(status_ddl)
+        # 旧版数据库补充 open_record_id 列（记录当前未结束记录的 id）
+        status_columns = [row[1] for row in conn.execute("PRAGMA table_info(current_status)")]
+        if 'open_record_id' not in status_columns:
+            conn.execute("ALTER TABLE current_status ADD COLUMN open_record_id INTEGER")
+        # 旧版数据库迁移为 WITHOUT ROWID、整数时间戳的新表（仅一行，直接复制）
+        status_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'current_status'"
+        ).fetchone()[0]
+        if 'WITHOUT ROWID' not in status_sql or 'last_start INTEGER' not in status_sql:
+            with self._transaction():
+                conn.execute("ALTER TABLE current_status RENAME TO current_status_old")
+                conn.execute(status_ddl)
+                conn.execute('''
+                    INSERT INTO current_status (id, current_activity, last_start, open_record_id)
+                    SELECT
+                        id,
+                        current_activity,
+                        CASE typeof(last_start)
+                            WHEN 'text' THEN CAST(strftime('%s', last_start, 'utc') AS INTEGER)
+                            ELSE last_start
+                        END,
+                        open_record_id
+                    FROM current_status_old
+                ''')
+                conn.execute("DROP TABLE current_status_old")
+        # 按开始/结束时间的覆盖索引 + 未结束记录的部分索引
+        has_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_tr_end'"
+        ).fetchone()
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tr_start
+            ON time_records(start_time, activity_type, end_time)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tr_end
+            ON time_records(end_time, start_time, activity_type)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tr_open
+            ON time_records(end_time) WHERE end_time IS NULL
+        ''')
+        if not has_index:
+            conn.execute("ANALYZE")
 
     def log_activity(self, activity_type):
-        """记录新的活动类型（相同状态不重复记录）"""
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        """记录新的活动类型（相同状态不重复记录），返回新记录的开始时间戳，未记录时返回 None"""
+        # 与内存中的当前状态相同时直接返回，不加写锁
+        if self.get_current_status()[0] == activity_type:
+            return None
+        now = int(time.time())
         
-        with self._get_connection() as conn:
+        with self._transaction() as conn:
             current = conn.execute(
-                "SELECT current_activity FROM current_status WHERE id = 1"
+                "SELECT current_activity, open_record_id FROM current_status WHERE id = 1"
             ).fetchone()
 
             if current and current[0] == activity_type:
-                return False
+                return None
 
             if current and current[0]:
-                conn.execute(
-                    "UPDATE time_records SET end_time = ? WHERE end_time IS NULL",
-                    (now,)
-                )
+                if current[1] is not None:
+                    # 按主键结束上一条记录，无需扫描
+                    conn.execute(
+                        "UPDATE time_records SET end_time = ? WHERE id = ? AND end_time IS NULL",
+                        (now, current[1])
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE time_records SET end_time = ? WHERE end_time IS NULL",
+                        (now,)
+                    )
 
-            conn.execute(
-                "REPLACE INTO current_status (id, current_activity, last_start) VALUES (1, ?, ?)",
-                (activity_type, now)
-            )
-            conn.execute(
+            record_id = conn.execute(
                 "INSERT INTO time_records (activity_type, start_time) VALUES (?, ?)",
                 (activity_type, now)
+            ).lastrowid
+            conn.execute(
+                "REPLACE INTO current_status (id, current_activity, last_start, open_record_id) VALUES (1, ?, ?, ?)",
+                (activity_type, now, record_id)
             )
-            conn.commit()
-            return True
+        self._current = (activity_type, now)
+        return now
 
     def get_today_records(self):
         """获取当日所有记录（修复时间计算）"""
-        today_start = datetime.now().replace(hour=0, minute=0, second=0).strftime('%Y-%m-%d %H:%M:%S')
-        with self._get_connection() as conn:
-            cursor = conn.execute(f'''
-                SELECT 
-                    activity_type,
-                    start_time,
-                    COALESCE(end_time, datetime('now')) as end_time,
-                    MAX(0, 
-                        (strftime('%s', COALESCE(end_time, datetime('now'))) 
-                        - strftime('%s', start_time))
-                    ) AS duration
-                FROM time_records
-                WHERE date(start_time) >= date('{today_start}')
-                ORDER BY start_time
-            ''')
-            return cursor.fetchall()
-
-    def get_history(self):
-        """获取完整历史记录"""
-        with self._get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT 
-                    activity_type,
-                    start_time,
-                    end_time,
-                    MAX(0, 
-                        (strftime('%s', COALESCE(end_time, datetime('now'))) 
-                        - strftime('%s', start_time))
-                    ) AS duration
-                FROM time_records
-                ORDER BY start_time
-            ''')
-            return cursor.fetchall()
+        today_start = int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        conn = self.read_conn
+        cursor = conn.execute('''
+            SELECT 
+                activity_type,
+                start_time,
+                COALESCE(end_time, :now) as end_time,
+                MAX(0, 
+                    COALESCE(end_time, :now) - start_time
+                ) AS duration
+            FROM time_records
+            WHERE start_time >= :today_start
+            ORDER BY start_time
+        ''', {'today_start': today_start, 'now': int(time.time())})
+        return cursor.fetchall()
+
+    def get_history(self, before=None, limit=200):
+        """分页获取历史记录，按开始时间倒序（时间与时长已在 SQL 中格式化为显示文本）"""
+        # 每行为 (id, start_time, 活动类型, 开始, 结束, 时长)；before 为上一页最后一行的
+        # (start_time, id)，按键集分页，不用 OFFSET 重复扫描已读过的行
+        params = {'limit': limit, 'now': int(time.time())}
+        if before is None:
+            where = ''
+        else:
+            where = 'WHERE (start_time, id) < (:before_start, :before_id)'
+            params['before_start'], params['before_id'] = before
+        conn = self.read_conn
+        cursor = conn.execute(f'''
+            SELECT 
+                id,
+                start_time,
+                activity_type,
+                datetime(start_time, 'unixepoch', 'localtime'),
+                CASE 
+                    WHEN end_time IS NULL THEN '进行中' 
+                    ELSE datetime(end_time, 'unixepoch', 'localtime') 
+                END,
+                MAX(0, 
+                    COALESCE(end_time, :now) - start_time
+                ) || '秒' AS duration
+            FROM time_records
+            {where}
+            ORDER BY start_time DESC, id DESC
+            LIMIT :limit
+        ''', params)
+        return cursor.fetchall()
 
     def get_current_status(self):
-        """获取当前状态"""
-        with self._get_connection() as conn:
+        """获取当前状态 (活动, 开始时间戳)，结果缓存在内存中直到下一次写入"""
+        if self._current is None:
+            conn = self.read_conn
             current = conn.execute(
                 "SELECT current_activity, last_start FROM current_status WHERE id = 1"
             ).fetchone()
-            return current if current else (None, None)
+            self._current = current if current else (None, None)
+        return self._current
         
     # 修改数据库查询方法（关键修改）
-    def get_date_records(self, target_date):
-        """获取指定日期及跨日未结束的记录（修正当日开始时间）"""
-        date_str = target_date.strftime('%Y-%m-%d')
-        start_of_day = datetime(target_date.year, target_date.month, target_date.day)
-        
-        with self._get_connection() as conn:
-            cursor = conn.execute(f'''
-                SELECT 
-                    activity_type,
-                    -- 调整开始时间为当日0点（如果跨日）
-                    CASE 
-                        WHEN start_time < '{start_of_day}' THEN '{start_of_day}' 
-                        ELSE start_time 
-                    END as adjusted_start,
-                    COALESCE(end_time, datetime('now')) as end_time,
-                    -- 重新计算持续时间（仅当日部分）
-                    MAX(0, 
-                        strftime('%s', COALESCE(end_time, datetime('now'))) 
-                        - strftime('%s', 
-                            CASE 
-                                WHEN start_time < '{start_of_day}' THEN '{start_of_day}' 
-                                ELSE start_time 
-                            END
-                        )
-                    ) AS duration
-                FROM time_records
-                WHERE 
-                    (
-                        date(start_time) = date('{date_str}') 
-                        OR 
-                        (
-                            start_time < '{start_of_day}' 
-                            AND 
-                            (end_time >= '{start_of_day}' OR end_time IS NULL)
-                        )
-                    )
-                ORDER BY start_time
-            ''')
-            return cursor.fetchall()
-        
-    def get_month_records(self, year, month):
-        """获取指定月份所有日期的记录（精确处理跨日记录）"""
-        start_date = datetime(year, month, 1)
-        next_month = month + 1 if month < 12 else 1
-        next_year = year if month < 12 else year + 1
-        end_date = datetime(next_year, next_month, 1) - timedelta(seconds=1)
-        
-        with self._get_connection() as conn:
-            cursor = conn.execute(f'''
-                SELECT 
-                    activity_type,
-                    start_time,
-                    COALESCE(end_time, datetime('now')) as end_time
-                FROM time_records
-                WHERE 
-                    start_time <= '{end_date}' 
-                    AND 
-                    (end_time >= '{start_date}' OR end_time IS NULL)
-            ''')
-            return cursor.fetchall()
+    def _cached_day_query(self, name, target_date, sql):
+        """执行按日查询；当日不含进行中的记录时结果不会再变，直接缓存"""
+        bounds = self._day_bounds(target_date)
+        key = (name, bounds['range_start'])
+        if key in self._day_cache:
+            return self._day_cache[key]
+        rows = self.read_conn.execute(sql, {**bounds, 'now': int(time.time())}).fetchall()
+        if self._open_since is None:
+            row = self.read_conn.execute(
+                "SELECT MIN(start_time) FROM time_records WHERE end_time IS NULL"
+            ).fetchone()
+            self._open_since = row[0] if row[0] is not None else float('inf')
+        if bounds['range_end'] <= self._open_since:
+            self._day_cache[key] = rows
+        return rows
+
+    def get_date_totals(self, target_date):
+        """按活动类型汇总指定日期的时长（秒），由 SQLite 完成聚合"""
+        return self._cached_day_query('totals', target_date, f'''
+            SELECT 
+                activity_type,
+                SUM(MAX(0, 
+                    COALESCE(end_time, :now)
+                    - MAX(start_time, :range_start)
+                )) AS total
+            FROM time_records
+            WHERE {self._RANGE_FILTER}
+            GROUP BY activity_type
+            HAVING total > 0
+            ORDER BY MIN(start_time)
+        ''')
+
+    @staticmethod
+    def _day_bounds(target_date):
+        """半开区间 [当日0点, 次日0点) 的时间戳，可直接走 start_time 索引"""
+        day_start = datetime(target_date.year, target_date.month, target_date.day)
+        return {
+            'range_start': int(day_start.timestamp()),
+            'range_end': int((day_start + timedelta(days=1)).timestamp())
+        }
+
+    def get_day_timeline_segments(self, slot_bounds):
+        """一次查询取出各时间段内的记录片段，起止已在 SQL 中裁剪到段内
+
+        按列返回 numpy 数组 (段序号, 活动序号, 起, 止)，按段序号排序，供绘图代码直接向量化计算
+        """
+        slots = ', '.join(f'({idx}, :lo{idx}, :hi{idx})' for idx in range(len(slot_bounds)))
+        params = {
+            'range_start': slot_bounds[0][0],
+            'range_end': slot_bounds[-1][1],
+            'now': int(time.time())
+        }
+        for idx, (lo, hi) in enumerate(slot_bounds):
+            params[f'lo{idx}'] = lo
+            params[f'hi{idx}'] = hi
+        
+        conn = self.read_conn
+        # 先用区间过滤取出当天的记录（走索引），再与各时间段连接
+        cursor = conn.execute(f'''
+            WITH 
+                slots(idx, lo, hi) AS (VALUES {slots}),
+                recs AS (
+                    SELECT 
+                        activity_type,
+                        start_time,
+                        COALESCE(end_time, :now) AS end_time
+                    FROM time_records
+                    WHERE {self._RANGE_FILTER}
+                )
+            SELECT 
+                slots.idx,
+                recs.activity_type,
+                MAX(recs.start_time, slots.lo) AS draw_start,
+                MIN(recs.end_time, slots.hi) AS draw_end
+            FROM slots
+            JOIN recs ON recs.start_time < slots.hi AND recs.end_time >= slots.lo
+            ORDER BY slots.idx, recs.start_time
+        ''', params)
+        rows = cursor.fetchall()
+        count = len(rows)
+        return (
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+            np.fromiter((ACT_ID[row[1]] for row in rows), dtype=np.int64, count=count),
+            np.fromiter((row[2] for row in rows), dtype=np.int64, count=count),
+            np.fromiter((row[3] for row in rows), dtype=np.int64, count=count),
+        )
+        
+    def get_month_daily_totals(self, year, month):
+        """按 (日, 活动类型) 汇总指定月份每天的时长（秒），跨日记录在 SQL 中按本地0点拆分"""
+        days = monthrange(year, month)[1]
+        range_start = datetime(year, month, 1)
+        params = {
+            'first_day': f"{year:04d}-{month:02d}-01",
+            'days': days,
+            'range_start': int(range_start.timestamp()),
+            'range_end': int((range_start + timedelta(days=days)).timestamp()),
+            'now': int(time.time())
+        }
+        
+        conn = self.read_conn
+        cursor = conn.execute(f'''
+            WITH RECURSIVE
+                days(d) AS (
+                    SELECT 1 UNION ALL SELECT d + 1 FROM days WHERE d < :days
+                ),
+                -- 每天的 [本地0点, 次日0点) 时间戳，'utc' 修饰符按本地时间换算
+                bounds(d, lo, hi) AS (
+                    SELECT 
+                        d,
+                        CAST(strftime('%s', :first_day, '+' || (d - 1) || ' days', 'utc') AS INTEGER),
+                        CAST(strftime('%s', :first_day, '+' || d || ' days', 'utc') AS INTEGER)
+                    FROM days
+                ),
+                recs AS (
+                    SELECT 
+                        activity_type,
+                        start_time,
+                        COALESCE(end_time, :now) AS end_time
+                    FROM time_records
+                    WHERE {self._RANGE_FILTER}
+                )
+            SELECT 
+                bounds.d,
+                recs.activity_type,
+                SUM(MIN(recs.end_time, bounds.hi) - MAX(recs.start_time, bounds.lo)) AS total
+            FROM bounds
+            JOIN recs ON recs.start_time < bounds.hi AND recs.end_time > bounds.lo
+            GROUP BY bounds.d, recs.activity_type
+        ''', params)
+        return cursor.fetchall()
         
     def _clear_history(self):
         """清空历史记录"""
         if tk.messagebox.askyesno("确认", "确定要清空所有历史记录吗？"):
-            with self._get_connection() as conn:
+            with self._transaction() as conn:
                 conn.execute("DELETE FROM time_records")
                 conn.execute("DELETE FROM current_status")
-                conn.commit()
+            # 回收被删除记录占用的页（须在事务外执行），并把 WAL 中的结果写回主库
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             tk.messagebox.showinfo("提示", "历史记录已清空")
             
     def manual_insert_activity(self, activity_type, start_time):
         """手动插入活动记录并调整相邻记录"""
-        start_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
+        start_ts = int(start_time.timestamp())
         
-        with self._get_connection() as conn:
+        with self._transaction() as conn:
             # 查找需要分割的原记录
             original = conn.execute('''
                 SELECT id, start_time, end_time 
@@ -242,7 +566,7 @@ class TimeTrackerDB:
                   AND (end_time >= ? OR end_time IS NULL)
                 ORDER BY start_time DESC
                 LIMIT 1
-            ''', (start_str, start_str)).fetchone()
+            ''', (start_ts, start_ts)).fetchone()
             
             if original:
                 orig_id, orig_start, orig_end = original
@@ -251,23 +575,23 @@ class TimeTrackerDB:
                     UPDATE time_records 
                     SET end_time = ? 
                     WHERE id = ?
-                ''', (start_str, orig_id))
+                ''', (start_ts, orig_id))
                 
                 # 插入新记录
-                new_end = orig_end if orig_end else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                conn.execute('''
+                new_end = orig_end if orig_end else int(time.time())
+                new_id = conn.execute('''
                     INSERT INTO time_records 
                         (activity_type, start_time, end_time)
                     VALUES (?, ?, ?)
-                ''', (activity_type, start_str, new_end))
+                ''', (activity_type, start_ts, new_end)).lastrowid
                 
                 # 处理后续记录
                 if orig_end:
                     conn.execute('''
                         UPDATE time_records 
                         SET start_time = ? 
-                        WHERE start_time = ? AND id != last_insert_rowid()
-                    ''', (new_end, orig_end))
+                        WHERE start_time = ? AND id != ?
+                    ''', (new_end, orig_end, new_id))
                 
             else:  # 没有重叠记录的情况
                 # 查找下一个记录
@@ -275,23 +599,20 @@ class TimeTrackerDB:
                     SELECT MIN(start_time) 
                     FROM time_records 
                     WHERE start_time > ?
-                ''', (start_str,)).fetchone()[0]
+                ''', (start_ts,)).fetchone()[0]
                 
-                end_time = next_record if next_record else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                end_time = next_record if next_record else int(time.time())
                 conn.execute('''
                     INSERT INTO time_records 
                         (activity_type, start_time, end_time)
                     VALUES (?, ?, ?)
-                ''', (activity_type, start_str, end_time))
-            
-            conn.commit()
+                ''', (activity_type, start_ts, end_time))
             
             
     def uncover_day(self, day):
         """取消覆盖日期"""
-        with self._get_connection() as conn:
-            conn.execute('DELETE FROM covered_days WHERE day = ?', (day.strftime('%Y-%m-%d'),))
-            conn.commit()
+        conn = self.conn
+        conn.execute('DELETE FROM covered_days WHERE day = ?', (day.strftime('%Y-%m-%d'),))
     
     
 # ================= GUI界面模块 =================
@@ -306,8 +627,23 @@ class TimeTrackerApp(tk.Tk):
         self._init_styles()  # 新增样式初始化方法
         
         self.db = TimeTrackerDB()
+        self._live_job = None  # 时间线“进行中”条形的定时刷新任务
+        self._live = None
         self._create_widgets()
         self._update_status_display()
+        # 长时间运行时每小时整理一次查询统计信息
+        self._optimize_job = self.after(OPTIMIZE_INTERVAL_MS, self._bg_optimize)
+
+    def destroy(self):
+        """关闭窗口时释放数据库连接"""
+        self.after_cancel(self._optimize_job)
+        self.db.close()
+        super().destroy()
+
+    def _bg_optimize(self):
+        """定时执行 PRAGMA optimize 并安排下一次"""
+        self.db.optimize()
+        self._optimize_job = self.after(OPTIMIZE_INTERVAL_MS, self._bg_optimize)
 
     def _init_styles(self):
         """初始化所有控件样式"""
@@ -419,22 +755,22 @@ class TimeTrackerApp(tk.Tk):
 
     def _handle_button_click(self, activity_type):
         """处理按钮点击事件"""
-        if self.db.log_activity(activity_type):
-            self._update_status_display()
+        start_time = self.db.log_activity(activity_type)
+        if start_time is not None:
+            self._update_status_display(activity_type, start_time)
 
-    def _update_status_display(self):
-        """更新状态显示"""
-        activity, start_time = self.db.get_current_status()
+    def _update_status_display(self, activity=None, start_time=None):
+        """更新状态显示（已知当前状态时直接传入，省去一次查询）"""
+        if start_time is None:
+            activity, start_time = self.db.get_current_status()
         if activity:
-            display_time = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S').strftime('%H:%M:%S')
+            display_time = time.strftime('%H:%M:%S', time.localtime(start_time))
             self.status_var.set(f"当前状态：{activity}\n开始时间：{display_time}")
         else:
             self.status_var.set("当前状态：未开始")
         
     def show_history(self):
-        """显示完整历史记录"""
-        records = self.db.get_history()
-        
+        """显示完整历史记录（按页加载，滚动接近底部时再取下一页）"""
         history_window = tk.Toplevel(self)
         history_window.title("历史记录")
         history_window.geometry("800x400")
@@ -455,18 +791,30 @@ class TimeTrackerApp(tk.Tk):
         tree.column('end', width=150, anchor='center')
         tree.column('duration', width=100, anchor='center')
         
-        for record in records:
-            end_time = record[2] if record[2] else "进行中"
-            duration = f"{record[3]}秒" if record[3] >= 0 else "计算错误"
-            tree.insert('', 'end', values=(
-                record[0],
-                record[1],
-                end_time,
-                duration
-            ))
-        
         scrollbar = ttk.Scrollbar(history_window, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
+        page_size = 200
+        paging = {'before': None, 'done': False, 'pending': False}
+
+        def load_page():
+            paging['pending'] = False
+            records = self.db.get_history(before=paging['before'], limit=page_size)
+            # 各列已是格式化好的文本
+            for record in records:
+                tree.insert('', 'end', values=record[2:])
+            if records:
+                paging['before'] = (records[-1][1], records[-1][0])
+            paging['done'] = len(records) < page_size
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            # 已加载的行滚动超过 80% 时预取下一页
+            if float(last) > 0.8 and not paging['done'] and not paging['pending']:
+                paging['pending'] = True
+                history_window.after_idle(load_page)
+
+        # 首页在表格 pack 之前插入，不触发布局计算
+        load_page()
+        tree.configure(yscrollcommand=on_scroll)
         
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -546,6 +894,8 @@ class TimeTrackerApp(tk.Tk):
 
     def show_analysis(self):
         """显示带日期选择的分析窗口（新增月视图选项卡）"""
+        self._load_matplotlib()
+        self._load_kernels()
         analysis_window = tk.Toplevel(self)
         analysis_window.title("数据分析")
         analysis_window.geometry("1400x800")
@@ -585,27 +935,80 @@ class TimeTrackerApp(tk.Tk):
         month_combo.pack(side=tk.LEFT, padx=5)
         month_control_frame.pack(side=tk.LEFT, padx=10)
         
-        # 应用按钮
+        # 应用按钮：连续点击合并为一次刷新
         ttk.Button(
             control_frame,
             text="应用",
-            command=self._refresh_analysis
+            command=self._schedule_refresh
         ).pack(side=tk.LEFT, padx=10)
         
         control_frame.pack(pady=10)
 
-        # 创建Notebook容器
+        # 创建Notebook容器：三个选项卡只创建一次，刷新时只替换其中的图表
         self.analysis_notebook = ttk.Notebook(analysis_window)
+        self._timeline_frame = ttk.Frame(self.analysis_notebook)
+        self._stats_frame = ttk.Frame(self.analysis_notebook)
+        self._month_frame = ttk.Frame(self.analysis_notebook)
+        self.analysis_notebook.add(self._timeline_frame, text="时间线")
+        self.analysis_notebook.add(self._stats_frame, text="统计")
+        self.analysis_notebook.add(self._month_frame, text="月视图")
+        
+        # 月视图的覆盖按钮只创建一次，图表放在其下方单独的容器里
+        self._month_shown = (self.selected_year.get(), self.selected_month.get())
+        cover_btn_frame = ttk.Frame(self._month_frame)
+        ttk.Button(
+            cover_btn_frame,
+            text="标记覆盖日期(Cover/Uncover)",
+            command=lambda: self._show_cover_dialog(*self._month_shown)
+        ).pack(side=tk.LEFT, padx=5)
+        cover_btn_frame.pack(fill=tk.X, pady=5)
+        self._month_chart_frame = ttk.Frame(self._month_frame)
+        self._month_chart_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self._refresh_job = None
+        self._last_rendered = {}  # 各类选项卡上次绘制时的输入：'day' / 'month'
+        self._stale_tabs = set()  # 内容已过期、切换到时需要重绘的选项卡
+        self._month_view = None  # 当前月视图的布局与条形，用于原地更新高度
+        self.analysis_notebook.bind('<<NotebookTabChanged>>', self._render_current_tab)
         self._refresh_analysis()
         self.analysis_notebook.pack(expand=True, fill='both')
 
 
+    def _load_matplotlib(self):
+        """按需导入 matplotlib，只在第一次调用时真正加载"""
+        global plt, FigureCanvasTkAgg, COVER_CMAP
+        if plt is None:
+            import matplotlib.pyplot as plt
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.colors import LinearSegmentedColormap
+            COVER_CMAP = LinearSegmentedColormap.from_list(
+                'pink_blue', ['#FF69B4', '#4169E1'], N=256)  # 修改颜色起止点
+
+    def _load_kernels(self):
+        """按需导入 numba 并编译数值核函数，只在第一次调用时真正加载"""
+        global month_stats
+        if month_stats is None:
+            try:
+                from numba import njit
+            except ImportError:  # numba 为可选依赖，未安装时使用纯 NumPy 实现
+                month_stats = _month_stats_numpy
+            else:
+                # cache=True 避免每次启动重新编译
+                month_stats = njit(cache=True)(_month_stats)
+
+    def _schedule_refresh(self):
+        """延迟 150ms 刷新，期间的重复请求只保留最后一次"""
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+        self._refresh_job = self.after(150, self._do_scheduled_refresh)
+
+    def _do_scheduled_refresh(self):
+        self._refresh_job = None
+        if self.analysis_notebook.winfo_exists():
+            self._refresh_analysis()
+
     def _refresh_analysis(self):
         """刷新分析内容"""
-        # 销毁旧内容
-        for child in self.analysis_notebook.winfo_children():
-            child.destroy()
-
         # 获取选定日期
         try:
             selected_date = datetime.strptime(self.selected_date.get(), '%Y-%m-%d')
@@ -613,131 +1016,222 @@ class TimeTrackerApp(tk.Tk):
             tk.messagebox.showerror("错误", "日期格式无效，请使用YYYY-MM-DD格式")
             return
 
-        # 获取数据
-        records = self.db.get_date_records(selected_date)
-        valid_records = [r for r in records if r[3] > 0]
-        
-        if not valid_records:
-            tk.messagebox.showinfo("提示", "选定日期没有有效数据")
+        # 获取图表：按（日期, 数据版本）缓存；含进行中记录的日期随时间变化，不走缓存
+        date_str = selected_date.strftime('%Y-%m-%d')
+        version = self.db.conn.total_changes
+        activity, last_start = self.db.get_current_status()
+        live = bool(last_start) and selected_date.date() >= datetime.fromtimestamp(last_start).date()
+        # 只重绘输入变化了的选项卡：日视图看（日期, 数据版本），月视图看（年, 月, 数据版本）
+        day_key = (date_str, version)
+        month_key = (self.selected_year.get(), self.selected_month.get(), version)
+        stale = set()
+
+        if live or day_key != self._last_rendered.get('day'):
+            self._stop_live_bar()
+            if live:
+                figures = self._build_day_figures.__wrapped__(self, date_str, version)
+            else:
+                figures = self._build_day_figures(date_str, version)
+            
+            if figures is None:
+                for frame in (self._timeline_frame, self._stats_frame, self._month_chart_frame):
+                    self._clear_frame(frame)
+                self._stale_tabs = set()
+                self._last_rendered = {}
+                tk.messagebox.showinfo("提示", "选定日期没有有效数据")
+                return
+
+            if not (activity and selected_date.date() == datetime.now().date()):
+                activity = None
+            self._day_view = (figures, activity, last_start)
+            stale.update(str(frame) for frame in (self._timeline_frame, self._stats_frame))
+            self._last_rendered['day'] = day_key
+
+        if month_key != self._last_rendered.get('month'):
+            stale.add(str(self._month_frame))
+            self._last_rendered['month'] = month_key
+
+        # 只绘制当前可见的选项卡，其余的等切换过去时再绘制
+        if stale:
+            self._stale_tabs |= stale
+            self._render_current_tab()
+
+    def _render_current_tab(self, event=None):
+        """绘制当前选项卡（如果内容已过期）"""
+        current = self.analysis_notebook.select()
+        if current not in self._stale_tabs:
             return
+        self._stale_tabs.discard(current)
+        (timeline_fig, stats_fig), activity, last_start = self._day_view
 
-        # 创建新内容
-        timeline_frame = ttk.Frame(self.analysis_notebook)
-        self._create_timeline_chart(timeline_frame, valid_records, selected_date)
-        self.analysis_notebook.add(timeline_frame, text="时间线")
-        
-        stats_frame = ttk.Frame(self.analysis_notebook)
-        self._create_stat_charts(stats_frame, valid_records)
-        self.analysis_notebook.add(stats_frame, text="统计")
-        
-        # 新增月视图内容
-        month_frame = ttk.Frame(self.analysis_notebook)
-        self._create_month_chart(month_frame)
-        self.analysis_notebook.add(month_frame, text="月视图")
+        if current == str(self._timeline_frame):
+            timeline_canvas = self._show_figure(self._timeline_frame, timeline_fig)
+            if activity:
+                self._start_live_bar(timeline_canvas, activity, last_start)
+        elif current == str(self._stats_frame):
+            if stats_fig is None:
+                self._clear_frame(self._stats_frame)
+                tk.messagebox.showinfo("提示", "没有有效数据可供展示")
+            else:
+                self._show_figure(self._stats_frame, stats_fig)
+        else:
+            # 新增月视图内容
+            self._create_month_chart(self._month_chart_frame)
+
+    @functools.lru_cache(maxsize=16)
+    def _build_day_figures(self, date_str, version):
+        """构建指定日期的时间线与统计图（version 变化即失效）"""
+        selected_date = datetime.fromisoformat(date_str)
+        totals = self.db.get_date_totals(selected_date)
+        if not totals:
+            return None
+        # 两张图互不依赖，放到工作线程里并行构建；Tk 控件仍只在主线程创建
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            timeline = pool.submit(self._create_timeline_chart, selected_date)
+            stats = pool.submit(self._create_stat_charts, totals)
+            return timeline.result(), stats.result()
+
+    def _show_figure(self, parent, fig):
+        """把（可能已缓存的）Figure 挂到选项卡上；已在显示的同一张图只请求重绘"""
+        canvas = getattr(parent, 'figure_canvas', None)
+        if canvas is not None and canvas.figure is fig:
+            canvas.draw_idle()
+            return canvas
+        self._clear_frame(parent)
+        canvas = FigureCanvasTkAgg(fig, master=parent)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        parent.figure_canvas = canvas
+        return canvas
+
+    @staticmethod
+    def _clear_frame(frame):
+        """清空选项卡中的旧控件"""
+        for child in frame.winfo_children():
+            child.destroy()
+        frame.figure_canvas = None
 
-    def _create_timeline_chart(self, parent, records, selected_date):
+    def _start_live_bar(self, canvas, activity, last_start):
+        """在当前时间段叠加一个 animated 条形，之后定时只 blit 这一段坐标轴"""
+        now = datetime.now()
+        slot = now.hour // 6
+        ax = canvas.figure.axes[slot]
+        # 条形位置按挂钟时间计算，与时间线的刻度一致
+        slot_start = datetime(now.year, now.month, now.day, slot * 6)
+        slot_hi = (slot_start + timedelta(hours=6)).timestamp()
+        left = max((datetime.fromtimestamp(last_start) - slot_start).total_seconds(), 0) / 3600
+        bar = ax.barh(
+            y=0,
+            width=0,
+            left=left,
+            height=2*0.618,
+            color=COLOR_RGB[ACT_ID[activity]],
+            edgecolor='white',
+            animated=True
+        )[0]
+        self._live = (canvas, ax, bar, slot_start, slot_hi)
+        # 整图重绘（如窗口缩放）后重新缓存背景并补画条形
+        self._live_cid = canvas.mpl_connect('draw_event', self._on_live_draw)
+        self._on_live_draw()
+        self._tick_live_bar()
+
+    def _on_live_draw(self, event=None):
+        """整图重绘不画 animated 条形：缓存新背景，再单独画上条形并 blit"""
+        canvas, ax, bar = self._live[:3]
+        self._live_background = canvas.copy_from_bbox(ax.bbox)
+        ax.draw_artist(bar)
+        canvas.blit(ax.bbox)
+
+    def _tick_live_bar(self):
+        """只更新进行中条形的宽度：恢复背景 → 画单个条形 → blit"""
+        self._live_job = None
+        canvas, ax, bar, slot_start, slot_hi = self._live
+        if not canvas.get_tk_widget().winfo_exists():
+            return
+        now = time.time()
+        elapsed = datetime.fromtimestamp(min(now, slot_hi)) - slot_start
+        bar.set_width(elapsed.total_seconds() / 3600 - bar.get_x())
+        canvas.restore_region(self._live_background)
+        ax.draw_artist(bar)
+        canvas.blit(ax.bbox)
+        if now < slot_hi:
+            self._live_job = self.after(LIVE_TICK_MS, self._tick_live_bar)
+
+    def _stop_live_bar(self):
+        if self._live_job is not None:
+            self.after_cancel(self._live_job)
+            self._live_job = None
+        if self._live is not None:
+            self._live[0].mpl_disconnect(self._live_cid)
+            self._live = None
+
+    def _create_timeline_chart(self, selected_date):
         """创建分段时间线图表（修复刻度标签问题）"""
         fig = plt.Figure(figsize=(10, 8), dpi=100)
-        time_slots = [
-            ("00:00-06:00", 0, 6),
-            ("06:00-12:00", 6, 12),
-            ("12:00-18:00", 12, 18),
-            ("18:00-24:00", 18, 23)
-        ]
-        
-        color_map = COLOR_SCHEME
         target_date = selected_date.date()
         
         axes = fig.subplots(4, 1, gridspec_kw={'height_ratios': [1,1,1,1]})
         
-        for idx, (title, start_hour, end_hour) in enumerate(time_slots):
+        # 各时间段的起止时间戳在循环外一次算好（最后一段截止到 23:59:59）
+        day = datetime(target_date.year, target_date.month, target_date.day)
+        slot_bounds = [
+            (int(day.replace(hour=start_hour).timestamp()),
+             int(day.replace(hour=end_hour).timestamp()) + (3599 if end_hour == 23 else 0))
+            for _, start_hour, end_hour in TIME_SLOTS
+        ]
+        
+        # 四个时间段的记录一次查出，按段序号排好，逐段切片
+        slot_ids, act_ids, starts, ends = self.db.get_day_timeline_segments(slot_bounds)
+        cuts = np.searchsorted(slot_ids, np.arange(len(TIME_SLOTS) + 1))
+        # 刻度是挂钟时间：起止换算成距当日0点的挂钟秒数（夏令时切换日一段不一定是 6 小时）
+        starts = _wall_seconds(starts, day)
+        ends = _wall_seconds(ends, day)
+        
+        for idx, (title, start_hour, end_hour) in enumerate(TIME_SLOTS):
             ax = axes[idx]
             ax.set_title(f"Time Quarter: {title}")
-            
-            # 固定时间段设置
-            slot_start = datetime(target_date.year, target_date.month, target_date.day, start_hour)
-            slot_end = datetime(target_date.year, target_date.month, target_date.day, end_hour)
-            
-            # 处理最后一个时间段
-            if title == "18:00-24:00":
-                slot_end = slot_end.replace(hour=23, minute=59, second=59)
                 
             # 绘制时间段背景
             ax.axhspan(ymin=-1, ymax=1, xmin=0, xmax=1, color='#F5F5F5', alpha=0.3)
             
-            # 绘制有效记录
-            for record in records:
-                # 使用调整后的开始时间（已在前端处理）
-                start = datetime.strptime(record[1], '%Y-%m-%d %H:%M:%S')
-                end = datetime.strptime(record[2], '%Y-%m-%d %H:%M:%S') if record[2] else datetime.now()
-                
-                # 截取在时间段内的有效部分
-                draw_start = max(start, slot_start)
-                draw_end = min(end, slot_end)
-                
-                # 跳过不在当前时间段的记录
-                if draw_start >= draw_end:
-                    continue
-                    
-                duration_hours = (draw_end - draw_start).total_seconds() / 3600
-                
-                # 计算相对位置（强制从时间段起点开始）
-                left_position = (draw_start - slot_start).total_seconds() / 3600
-                if left_position < 0:
-                    left_position = 0
-                    duration_hours = (draw_end - slot_start).total_seconds() / 3600
-
-                ax.barh(
-                    y=0,
-                    width=duration_hours,
-                    left=left_position,
-                    height=2*0.618,
-                    color=color_map[record[0]],
-                    edgecolor='white'
-                )
-        
-            # 修复刻度标签问题（关键修改）
-            if end_hour == 23:
-                hours_in_slot = end_hour - start_hour+1
-            else:
-                hours_in_slot = end_hour - start_hour
-            ax.set_xlim(0, hours_in_slot)  # 根据实际时间段设置范围
-            ax.set_xticks([x * 0.5 for x in range(0, 2 * hours_in_slot + 1)])  # 包含起始和结束刻度
-            
-            # 生成正确的刻度标签
-            time_labels = [
-                f"{(start_hour + x // 2) % 24:02d}:{(x % 2) * 30:02d}" 
-                for x in range(0, 2 * hours_in_slot + 1)
-            ]
-            ax.set_xticklabels(time_labels)
+            # 本时间段的记录片段（SQL 中已裁剪），整段一次绘制
+            part = slice(cuts[idx], cuts[idx + 1])
+            lefts, widths, mask = bar_geometry(starts[part], ends[part], start_hour * 3600)
             
+            # 修复刻度标签问题（关键修改）：刻度已预先生成
+            tick_positions, tick_labels = SLOT_TICKS[(start_hour, end_hour)]
+            ax.set_xlim(0, tick_positions[-1])  # 根据实际时间段设置范围
             ax.yaxis.set_visible(False)
+            
+            # 没有记录的时间段只保留背景，不生成刻度、标签和网格线
+            if not mask.any():
+                ax.set_xticks([])
+                continue
+            
+            ax.broken_barh(
+                list(zip(lefts[mask], widths[mask])),
+                (-0.618, 2*0.618),
+                facecolors=COLOR_RGB[act_ids[part][mask]],
+                edgecolor='white'
+            )
+            ax.set_xticks(tick_positions)
+            ax.set_xticklabels(tick_labels)
             ax.grid(axis='x', alpha=0.3)
 
         fig.tight_layout()
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        return fig
         
-    def _create_stat_charts(self, parent, records):
-        """创建统计图表（增加数据校验）"""
+    def _create_stat_charts(self, totals):
+        """创建统计图表（totals 为数据库汇总的 [(活动类型, 秒数)]，已过滤无效数据）"""
         fig = plt.Figure(figsize=(10, 8), dpi=100)
         
-        # 计算总时长
-        durations = {}
-        for record in records:
-            if record[3] > 0:
-                durations[record[0]] = durations.get(record[0], 0) + record[3]
-        
-        # 过滤无效数据
-        activities = [k for k, v in durations.items() if v > 0]
-        times = [durations[k] / 3600 for k in activities]  # 转换为小时
+        activities = [activity for activity, _ in totals]
+        times = [seconds / 3600 for _, seconds in totals]  # 转换为小时
         
         if not activities:
-            tk.messagebox.showinfo("提示", "没有有效数据可供展示")
-            return
+            return None
 
-        used_colors = [COLOR_SCHEME[act] for act in activities]
+        used_colors = COLOR_RGB[[ACT_ID[act] for act in activities]]
 
         # 柱状图
         ax1 = fig.add_subplot(211)
@@ -753,132 +1247,119 @@ class TimeTrackerApp(tk.Tk):
                autopct=lambda p: f'{p:.1f}%\n({p*total/100:.1f}h)',
                startangle=90)
         ax2.set_title("Time Distribution")
-
-        canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        return fig
         
     def _create_month_chart(self, parent):
         """创建月视图堆叠条形图（优化版）"""
         year = self.selected_year.get()
         month = self.selected_month.get()
-        records = self.db.get_month_records(year, month)
+        self._month_shown = (year, month)  # 覆盖按钮作用于当前显示的月份
+        totals = self.db.get_month_daily_totals(year, month)
         covered_days = self.db.get_covered_days(year, month)
         
-        # 创建自定义渐变色
-        from matplotlib.colors import LinearSegmentedColormap
-        pink_blue = LinearSegmentedColormap.from_list(
-            'pink_blue', ['#FF69B4', '#4169E1'], N=256)  # 修改颜色起止点
-        
         # 处理原始数据
         activity_order = [
             'Work', 'Study', 'Meeting', 'Exercise',
             'Chores', 'Commute', 'Rest/Entertain', 'Sleep'
         ]
         
-        # 初始化每日数据存储结构
-        days_in_month = (datetime(year + (month // 12), (month % 12) + 1, 1) - 
-                        datetime(year, month, 1)).days
-        daily_data = {day: {'total': 0, 'data': {act: 0 for act in activity_order}} 
-                    for day in range(1, days_in_month + 1)}
+        order_index = {act: i for i, act in enumerate(activity_order)}
+        colors = COLOR_RGB[[ACT_ID[act] for act in activity_order]]  # 与 activity_order 对齐
+        days_in_month = monthrange(year, month)[1]
         
-        # 改进后的时间分割算法
-        for record in records:
-            try:
-                start = datetime.strptime(record[1], '%Y-%m-%d %H:%M:%S')
-                end = datetime.strptime(record[2], '%Y-%m-%d %H:%M:%S') if record[2] else datetime.now()
-                act_type = record[0]  # 始终使用记录中的原始活动类型
-                
-                # 确保时间范围有效性
-                if start >= end:
-                    continue
-                    
-                current_day = start.date()
-                last_day = end.date()
-                
-                while current_day <= last_day:
-                    if current_day.month == month and current_day.year == year:
-                        day_start = max(start, datetime.combine(current_day, datetime.min.time()))
-                        day_end = min(end, datetime.combine(current_day, datetime.max.time()))
-                        
-                        if day_start < day_end:
-                            duration = (day_end - day_start).total_seconds() / 3600
-                            daily_data[current_day.day]['data'][act_type] += duration
-                            daily_data[current_day.day]['total'] += duration
-                            
-                    current_day += timedelta(days=1)
-                    
-            except Exception as e:
-                print(f"Error processing record {record}: {str(e)}")
-                continue
+        # 按天分割与汇总已在 SQL 中完成，这里只把 (日, 活动, 秒) 填进 M[天, 活动] 小时矩阵
+        totals = [row for row in totals if row[1] in order_index]
+        count = len(totals)
+        day_idx = np.fromiter((row[0] - 1 for row in totals), dtype=np.int64, count=count)
+        act_idx = np.fromiter((order_index[row[1]] for row in totals), dtype=np.int64, count=count)
+        M = np.zeros((days_in_month, len(activity_order)), dtype=np.float32)
+        M[day_idx, act_idx] = np.fromiter((row[2] for row in totals), dtype=np.float64, count=count) / 3600
         
-        # 准备绘图数据（包含平均列）
-        valid_days = [d for d in daily_data 
-                    if daily_data[d]['total'] >= 23.9 
-                    and datetime(year, month, d).date() not in covered_days]
+        # 覆盖日期掩码只建一次，平均值筛选和条形位置都用它
+        covered_mask = np.zeros(days_in_month, dtype=bool)
+        covered_mask[[d - 1 for d in covered_days]] = True
+        
+        # 准备绘图数据（包含平均列）：只统计记满一天且未覆盖的日期
+        valid_mask = (M.sum(axis=1) >= 23.9) & ~covered_mask
         
         # 计算平均值
-        avg_data = {act: 0 for act in activity_order}
-        if valid_days:
-            for act in activity_order:
-                avg_data[act] = sum(daily_data[d]['data'][act] for d in valid_days) / len(valid_days)
+        avg_data = month_stats(M, valid_mask)
+        
+        # 每日数据和平均列的堆叠条形：x 位置与各层高度、底部
+        max_day = days_in_month + 1  # 为平均列留位置
+        plot_days = np.flatnonzero(~covered_mask) + 1
+        heights = M[~covered_mask]
+        if valid_mask.any():
+            plot_days = np.append(plot_days, max_day)
+            heights = np.vstack((heights, avg_data))
+        # 按 activity_order 倒序自下而上堆叠
+        layers = heights[:, ::-1]
+        layer_colors = colors[::-1]
+        bottoms = np.cumsum(layers, axis=1, dtype=np.float64) - layers
+        
+        # 同一月份、条形位置不变时（如只是数据更新），直接改已有条形的高度
+        layout = (year, month, tuple(plot_days))
+        view = self._month_view
+        if view is not None and view['layout'] == layout and parent.figure_canvas is view['canvas']:
+            for col, bars in enumerate(view['bars']):
+                for rect, height, bottom in zip(bars, layers[:, col], bottoms[:, col]):
+                    rect.set_height(height)
+                    rect.set_y(bottom)
+            view['canvas'].draw_idle()
+            return
+        self._clear_frame(parent)
         
         # 创建图表（包含平均列）
         fig = plt.Figure(figsize=(16, 6), dpi=100)
         ax = fig.add_subplot(111)
+        ax.set_autoscale_on(False)  # 坐标范围在下面固定设置，添加条形时无需自动缩放
         
         # 调整x轴范围
-        max_day = days_in_month + 1  # 为平均列留位置
         x_ticks = list(range(1, days_in_month + 1)) + [max_day]
         x_labels = [str(d) for d in range(1, days_in_month + 1)] + ['Avg']
         
-        # 绘制每日数据
-        for day in range(1, days_in_month + 1):
-            date_obj = datetime(year, month, day).date()
-            if date_obj in covered_days:
-                # 绘制渐变覆盖效果
-                gradient = np.linspace(0, 1, 256).reshape(1, -1)
-                gradient = np.vstack((gradient, gradient))
-                ax.imshow(
-                    gradient, 
-                    aspect='auto', 
-                    cmap=pink_blue,
-                    extent=[day-0.4, day+0.4, 0, 24],  # 调整宽度与普通条形一致
-                    alpha=0.24,
-                    origin='lower'
-                )
-                ax.text(day, 12, "Covered", ha='center', va='center', 
-                       rotation=90, color='white', fontweight='bold')
-            else:
-                bottom = 0
-                for act in reversed(activity_order):
-                    value = daily_data[day]['data'][act]
-                    ax.bar(
-                        day, value, 
-                        bottom=bottom,
-                        color=COLOR_SCHEME.get(act, "#CCCCCC"),
-                        edgecolor='white',
-                        width=0.8
-                    )
-                    bottom += value
-        
-        # 绘制平均列
-        if valid_days:
-            bottom = 0
-            for act in reversed(activity_order):
-                value = avg_data[act]
-                ax.bar(
-                    max_day, value,
-                    bottom=bottom,
-                    color=COLOR_SCHEME[act],
-                    edgecolor='white',
-                    width=0.8
-                )
-                bottom += value
+        # 绘制覆盖日期
+        for day in sorted(covered_days):
+            # 绘制渐变覆盖效果
+            ax.imshow(
+                COVER_GRADIENT, 
+                aspect='auto', 
+                cmap=COVER_CMAP,
+                extent=[day-0.4, day+0.4, 0, 24],  # 调整宽度与普通条形一致
+                alpha=0.24,
+                origin='lower'
+            )
+        # 覆盖标记：所有覆盖日期一次画出斜线填充，图例中统一说明，不再逐日添加文字
+        if covered_days:
+            ax.bar(
+                sorted(covered_days), 24,
+                width=0.8,
+                color='none',
+                hatch='///',
+                edgecolor='white',
+                linewidth=0
+            )
+        
+        # 绘制每日数据和平均列：每种活动一次 bar 调用画出所有日期上的这一层
+        bars = [
+            ax.bar(
+                plot_days, layers[:, col],
+                bottom=bottoms[:, col],
+                color=color,
+                edgecolor='white',
+                width=0.8
+            )
+            for col, color in enumerate(layer_colors)
+        ]
         
         # 添加图例
-        handles = [plt.Rectangle((0,0),1,1, color=COLOR_SCHEME[act]) for act in activity_order]
-        ax.legend(handles, activity_order, title="Activity Type", bbox_to_anchor=(1, 1), loc='upper left')
+        handles = [plt.Rectangle((0,0),1,1, color=color) for color in colors]
+        labels = list(activity_order)
+        if covered_days:
+            handles.append(plt.Rectangle((0,0),1,1, facecolor=COVER_CMAP(0.5), alpha=0.24,
+                                         hatch='///', edgecolor='white'))
+            labels.append("Covered")
+        ax.legend(handles, labels, title="Activity Type", bbox_to_anchor=(1, 1), loc='upper left')
         
         # 设置样式
         ax.set_xlabel("Day of Month")
@@ -891,71 +1372,39 @@ class TimeTrackerApp(tk.Tk):
         ax.set_yticks(range(0, 25, 1))  # 以1h为单位设置Y轴刻度
         ax.grid(axis='y', alpha=0.3)
         
-        # 在GUI界面添加覆盖按钮（非图表内嵌）
-        control_frame = ttk.Frame(parent)
-        ttk.Button(
-            control_frame,
-            text="标记覆盖日期(Cover/Uncover)",
-            command=lambda: self._show_cover_dialog(year, month)
-        ).pack(side=tk.LEFT, padx=5)
-        control_frame.pack(fill=tk.X, pady=5)
-        
         # 显示图表
         canvas = FigureCanvasTkAgg(fig, master=parent)
-        canvas.draw()
+        canvas.draw_idle()  # 交给 Tk 空闲时绘制，连续刷新只画一次
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        parent.figure_canvas = canvas
+        self._month_view = {'layout': layout, 'bars': bars, 'canvas': canvas}
         
     def _cover_current_day(self, year, month):
         """处理当日覆盖操作"""
-        dialog = tk.Toplevel(self)
-        dialog.title("选择覆盖日期")
-        dialog.geometry("300x150")
-        
-        ttk.Label(dialog, text="选择日期:").pack(pady=10)
-        
-        day_var = tk.IntVar(value=1)
-        day_spin = ttk.Spinbox(
-            dialog, 
-            from_=1, 
-            to=31, 
-            textvariable=day_var,
-            width=5
-        )
-        day_spin.pack()
-        
-        def confirm_cover():
-            try:
-                day = day_var.get()
-                target_date = datetime(year, month, day).date()
-                self.db.cover_day(target_date)
-                self._refresh_analysis()
-                dialog.destroy()
-            except ValueError as e:
-                messagebox.showerror("错误", f"无效日期: {str(e)}")
-        
-        ttk.Button(
-            dialog, 
-            text="确认覆盖", 
-            command=confirm_cover
-        ).pack(pady=10)
-        
+        self._open_cover_dialog(year, month, allow_uncover=False)
         
     def _show_cover_dialog(self, year, month):
         """显示覆盖/取消覆盖对话框"""
+        self._open_cover_dialog(year, month, allow_uncover=True)
+
+    def _open_cover_dialog(self, year, month, allow_uncover):
+        """覆盖日期对话框；allow_uncover 为 True 时可选择取消覆盖"""
         dialog = tk.Toplevel(self)
-        dialog.title("日期覆盖管理")
-        dialog.geometry("320x180")
+        dialog.title("日期覆盖管理" if allow_uncover else "选择覆盖日期")
+        dialog.geometry("320x180" if allow_uncover else "300x150")
         
-        ttk.Label(dialog, text="请选择日期和操作类型:").pack(pady=10)
+        ttk.Label(
+            dialog, text="请选择日期和操作类型:" if allow_uncover else "选择日期:"
+        ).pack(pady=10)
         
-        # 日期选择
+        # 日期选择（上限为当月实际天数）
         day_frame = ttk.Frame(dialog)
         ttk.Label(day_frame, text="日期:").pack(side=tk.LEFT)
         day_var = tk.IntVar(value=1)
         day_spin = ttk.Spinbox(
             day_frame, 
             from_=1, 
-            to=31, 
+            to=monthrange(year, month)[1], 
             textvariable=day_var,
             width=5
         )
@@ -963,35 +1412,36 @@ class TimeTrackerApp(tk.Tk):
         day_frame.pack()
         
         # 操作类型选择
-        action_frame = ttk.Frame(dialog)
-        ttk.Label(action_frame, text="操作:").pack(side=tk.LEFT)
         action_var = tk.StringVar(value="cover")
-        ttk.Radiobutton(
-            action_frame, text="覆盖", 
-            variable=action_var, value="cover"
-        ).pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(
-            action_frame, text="取消覆盖", 
-            variable=action_var, value="uncover"
-        ).pack(side=tk.LEFT, padx=5)
-        action_frame.pack(pady=10)
+        if allow_uncover:
+            action_frame = ttk.Frame(dialog)
+            ttk.Label(action_frame, text="操作:").pack(side=tk.LEFT)
+            ttk.Radiobutton(
+                action_frame, text="覆盖", 
+                variable=action_var, value="cover"
+            ).pack(side=tk.LEFT, padx=5)
+            ttk.Radiobutton(
+                action_frame, text="取消覆盖", 
+                variable=action_var, value="uncover"
+            ).pack(side=tk.LEFT, padx=5)
+            action_frame.pack(pady=10)
         
         def perform_action():
             try:
-                day = day_var.get()
-                target_date = datetime(year, month, day).date()
-                if action_var.get() == "cover":
-                    self.db.cover_day(target_date)
-                else:
-                    self.db.uncover_day(target_date)
-                self._refresh_analysis()
-                dialog.destroy()
-            except ValueError as e:
+                target_date = date(year, month, day_var.get())
+            except (ValueError, tk.TclError) as e:
                 messagebox.showerror("错误", f"无效日期: {str(e)}")
+                return
+            if action_var.get() == "cover":
+                self.db.cover_day(target_date)
+            else:
+                self.db.uncover_day(target_date)
+            self._refresh_analysis()
+            dialog.destroy()
         
         ttk.Button(
             dialog, 
-            text="确认执行", 
+            text="确认执行" if allow_uncover else "确认覆盖", 
             command=perform_action
         ).pack(pady=10)
         